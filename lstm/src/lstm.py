@@ -2,17 +2,21 @@ import os
 import sys
 import json
 import grpc
+import asyncio
 import logging
+import threading
 import numpy as np
 import tensorflow as tf
 from concurrent import futures
-from utils import pad_or_truncate_sequence
+from numpy.lib.stride_tricks import sliding_window_view
+from utils import convert_to_tflite, dedup_filter
 import prediction_services_pb2
 import prediction_services_pb2_grpc
 
 MAX_MESSAGE_LENGTH = 1024 * 1024 * 50
 MODEL_DIR = os.path.dirname(__file__)
 MODEL_PATH = os.path.join(MODEL_DIR, '../models', 'best_model_tf.keras')
+TFLITE_MODEL_PATH = os.path.join(MODEL_DIR, '../models', 'best_model.tflite')
 LABEL_MAP_PATH = os.path.join(MODEL_DIR, '../models', 'label_map.json')
 
 JUST_HANDS = (21 * 3 * 2)
@@ -21,24 +25,134 @@ SEQUENCE_LENGTH = 80
 
 WINDOW_SIZE = 30 
 WINDOW_STRIDE = 10
+CONFIDENCE_THRESHOLD = 0.6
+
+# Cross-request batching
+MAX_BATCH_REQUESTS = 32
+BATCH_TIMEOUT_S = 0.005
+# Inference batches are padded to power-of-two sizes up to this cap, so the
+# interpreter only ever sees a handful of input shapes
+MAX_BUCKET_SIZE = 64
+WARMUP_BATCH_SIZE = 4
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+def run_inference(batch: np.ndarray) -> np.ndarray:
+    """
+    Runs a batch of windows through the shared TFLite interpreter, or through the
+    graph-mode Keras model if TFLite is unavailable.
+    The input tensor is only resized when the batch size changes.
+    """
+    if interpreter is None:
+        return _infer(tf.convert_to_tensor(batch)).numpy()
+    with interpreter_lock:
+        if tuple(interpreter.get_input_details()[0]['shape']) != batch.shape:
+            interpreter.resize_tensor_input(INPUT_INDEX, batch.shape)
+            interpreter.allocate_tensors()
+        interpreter.set_tensor(INPUT_INDEX, batch)
+        interpreter.invoke()
+        return interpreter.get_tensor(OUTPUT_INDEX)
+
+def run_bucketed_inference(batch: np.ndarray) -> np.ndarray:
+    """
+    Runs a batch of any size in chunks of at most MAX_BUCKET_SIZE windows, padding each
+    chunk with zero windows up to the next power of two and dropping their outputs.
+    """
+    outputs = []
+    for start in range(0, batch.shape[0], MAX_BUCKET_SIZE):
+        chunk = batch[start:start + MAX_BUCKET_SIZE]
+        bucket_size = min(1 << (chunk.shape[0] - 1).bit_length(), MAX_BUCKET_SIZE)
+        padded = np.zeros((bucket_size,) + chunk.shape[1:], dtype=np.float32)
+        padded[:chunk.shape[0]] = chunk
+        outputs.append(run_inference(padded)[:chunk.shape[0]])
+    return np.concatenate(outputs) if len(outputs) > 1 else outputs[0]
+
 # Load Model and Label Map
 try:
     with open(LABEL_MAP_PATH, 'r') as f:
         idx_to_label_str_keys = json.load(f)
         IDX_TO_LABEL = {int(k): v for k, v in idx_to_label_str_keys.items()}
+        # Lookup by class index: True for classes that produce a word, False for '_blank_'
+        IS_WORD = np.zeros(max(IDX_TO_LABEL) + 1, dtype=np.bool_)
+        IS_WORD[[k for k, v in IDX_TO_LABEL.items() if v != '_blank_']] = True
+    # Compile the post-processing kernel before serving
+    dedup_filter(np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.float32), IS_WORD, CONFIDENCE_THRESHOLD)
     model = tf.keras.models.load_model(MODEL_PATH)
-    dummy_input = np.zeros((1, SEQUENCE_LENGTH, JUST_HANDS), dtype=np.float32)
-    model.predict(dummy_input, verbose=0)
+    # Graph-mode Keras path, traced once for any batch size; used if TFLite is unavailable.
+    _infer = tf.function(
+        lambda x: model(x, training=False),
+        input_signature=[tf.TensorSpec((None, SEQUENCE_LENGTH, JUST_HANDS), tf.float32)]
+    )
+    interpreter = None
+    interpreter_lock = threading.Lock()
+    try:
+        if not os.path.exists(TFLITE_MODEL_PATH) or os.path.getmtime(TFLITE_MODEL_PATH) < os.path.getmtime(MODEL_PATH):
+            convert_to_tflite(model, TFLITE_MODEL_PATH)
+            logging.info(f"Converted Keras model to TFLite: {TFLITE_MODEL_PATH}")
+        # The TFLite interpreter applies the XNNPACK delegate to float ops by default.
+        interpreter = tf.lite.Interpreter(model_path=TFLITE_MODEL_PATH, num_threads=(os.cpu_count() or 4))
+        interpreter.allocate_tensors()
+        INPUT_INDEX = interpreter.get_input_details()[0]['index']
+        OUTPUT_INDEX = interpreter.get_output_details()[0]['index']
+        # Invoke with a batch > 1 so resize and Flex-op failures surface here, not per RPC
+        run_inference(np.zeros((WARMUP_BATCH_SIZE, SEQUENCE_LENGTH, JUST_HANDS), dtype=np.float32))
+    except Exception as e:
+        interpreter = None
+        logging.warning(f"TFLite model unavailable, serving the Keras model in graph mode. Error: {e}")
+    if interpreter is None:
+        # Warm up the graph-mode fallback
+        run_inference(np.zeros((WARMUP_BATCH_SIZE, SEQUENCE_LENGTH, JUST_HANDS), dtype=np.float32))
     logging.info(f"Successfully loaded model and label map for {JUST_HANDS}-dimensional input.")
 except Exception as e:
     logging.critical(f"FATAL ERROR: Could not load resources. Exiting. Error: {e}", exc_info=True)
     sys.exit(1)
 
+class InferenceBatcher:
+    """
+    Coalesces window batches from concurrent requests into a single model call.
+    Inference runs on a dedicated thread so the event loop keeps accepting requests.
+    """
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.executor = futures.ThreadPoolExecutor(max_workers=1)
+
+    async def submit(self, batch: np.ndarray) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((batch, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            deadline = loop.time() + BATCH_TIMEOUT_S
+            while len(pending) < MAX_BATCH_REQUESTS:
+                timeout = deadline - loop.time()
+                if timeout <= 0: break
+                try:
+                    pending.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            batches = [batch for batch, _ in pending]
+            try:
+                combined = np.concatenate(batches) if len(batches) > 1 else batches[0]
+                prediction_probs = await loop.run_in_executor(self.executor, run_bucketed_inference, combined)
+                results = np.split(prediction_probs, np.cumsum([len(batch) for batch in batches[:-1]]))
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(pending, results):
+                if not future.done():
+                    future.set_result(result)
+
 class LstmPredictionService(prediction_services_pb2_grpc.LstmServiceServicer):
-    def Predict(self, request, context):
+    def __init__(self, batcher: InferenceBatcher):
+        self.batcher = batcher
+
+    async def Predict(self, request, context):
         """
         Predicts a sequence of gestures from a continuous stream of keypoints
         using a sliding window and a model trained with a '_blank_' class.
@@ -58,33 +172,27 @@ class LstmPredictionService(prediction_services_pb2_grpc.LstmServiceServicer):
                 context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
                 return prediction_services_pb2.LstmResponse()
 
-            raw_predictions = []
+            final_sentence = []
+            raw_indices = np.empty(0, dtype=np.int64)
             total_frames = live_sequence_np.shape[0]
 
-            for i in range(0, total_frames - WINDOW_SIZE + 1, WINDOW_STRIDE):
-                window = live_sequence_np[i : i + WINDOW_SIZE, :]
-                
-                sequence_to_predict = pad_or_truncate_sequence(window, SEQUENCE_LENGTH)
-                sequence_to_predict = np.expand_dims(sequence_to_predict, axis=0)
-                
-                prediction_probs = model.predict(sequence_to_predict, verbose=0)
-                predicted_index = np.argmax(prediction_probs)
-                predicted_label = IDX_TO_LABEL.get(predicted_index, "_blank_")
-
-                if np.max(prediction_probs) > 0.6:
-                    raw_predictions.append(predicted_label)
-            
-            final_sentence = []
-            if raw_predictions:
-                if raw_predictions[0] != '_blank_':
-                    final_sentence.append(raw_predictions[0])
-                
-                for pred in raw_predictions[1:]:
-                    if pred != '_blank_' and (not final_sentence or pred != final_sentence[-1]):
-                        final_sentence.append(pred)
+            if total_frames >= WINDOW_SIZE:
+                # (num_windows, WINDOW_SIZE, JUST_HANDS) view over the stream, no copies
+                windows = sliding_window_view(live_sequence_np, WINDOW_SIZE, axis=0)[::WINDOW_STRIDE].transpose(0, 2, 1)
+                # WINDOW_SIZE < SEQUENCE_LENGTH, so every window is post-padded with zeros
+                batch = np.zeros((windows.shape[0], SEQUENCE_LENGTH, JUST_HANDS), dtype=np.float32)
+                batch[:, :WINDOW_SIZE, :] = windows
+
+                prediction_probs = await self.batcher.submit(batch)
+                pred_idx = prediction_probs.argmax(axis=1)
+                pred_max = prediction_probs.max(axis=1)
+                raw_indices = pred_idx[pred_max > CONFIDENCE_THRESHOLD]
+
+                word_indices, num_words = dedup_filter(pred_idx, pred_max, IS_WORD, CONFIDENCE_THRESHOLD)
+                final_sentence = [IDX_TO_LABEL[idx] for idx in word_indices[:num_words].tolist()]
 
             response_text = " ".join(final_sentence)
-            logging.info(f"Raw predictions: {raw_predictions}")
+            logging.info(f"Raw predictions: {[IDX_TO_LABEL.get(idx, '_blank_') for idx in raw_indices.tolist()]}")
             logging.info(f"Final sentence: '{response_text}'")
             return prediction_services_pb2.LstmResponse(translated_text=response_text)
 
@@ -94,19 +202,23 @@ class LstmPredictionService(prediction_services_pb2_grpc.LstmServiceServicer):
             context.set_code(grpc.StatusCode.INTERNAL)
             return prediction_services_pb2.LstmResponse()
 
-def serve():
-    server = grpc.server(
-        futures.ThreadPoolExecutor(max_workers=(os.cpu_count() or 4)),
+async def serve():
+    server = grpc.aio.server(
         options=[
             ('grpc.max_receive_message_length', MAX_MESSAGE_LENGTH),
             ('grpc.max_send_message_length', MAX_MESSAGE_LENGTH)
         ]
     )
-    prediction_services_pb2_grpc.add_LstmServiceServicer_to_server(LstmPredictionService(), server)
+    batcher = InferenceBatcher()
+    batcher_task = asyncio.create_task(batcher.run())
+    prediction_services_pb2_grpc.add_LstmServiceServicer_to_server(LstmPredictionService(batcher), server)
     server.add_insecure_port("[::]:50051")
     logging.info("LSTM gRPC Server started on port 50051.")
-    server.start()
-    server.wait_for_termination()
+    await server.start()
+    try:
+        await server.wait_for_termination()
+    finally:
+        batcher_task.cancel()
 
 if __name__ == "__main__":
-    serve()
+    asyncio.run(serve())
@@ -1,22 +1,52 @@
 
+import tempfile
 import numpy as np
+import tensorflow as tf
+from numba import njit
 
-def pad_or_truncate_sequence(sequence: np.ndarray, target_length: int, padding_value: float = 0.0) -> np.ndarray:
+def convert_to_tflite(model: tf.keras.Model, output_path: str) -> None:
     """
-    Pads or truncates a NumPy sequence to a target length.
+    Converts a Keras model to a float16-weight TFLite FlatBuffer.
+    The model is exported as a SavedModel first; TFLiteConverter.from_keras_model
+    does not support Keras 3 models.
 
     Args:
-        sequence (np.ndarray): The input NumPy array representing a sequence of keypoints.
-                               Shape: (num_frames, feature_dim).
-        target_length (int): The desired length of the sequence.
-        padding_value (float): The value to use for padding.
+        model (tf.keras.Model): The trained Keras model.
+        output_path (str): Where to write the .tflite file.
+    """
+    with tempfile.TemporaryDirectory() as export_dir:
+        model.export(export_dir)
+        converter = tf.lite.TFLiteConverter.from_saved_model(export_dir)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+        # Masked Bi-LSTM layers may lower to ops outside the TFLite builtin set.
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS, tf.lite.OpsSet.SELECT_TF_OPS]
+        tflite_model = converter.convert()
+    with open(output_path, 'wb') as f:
+        f.write(tflite_model)
+
+
+@njit(cache=True)
+def dedup_filter(pred_idx: np.ndarray, pred_max: np.ndarray, is_word: np.ndarray, threshold: float):
+    """
+    Collapses per-window predictions into a sequence of word indices.
+
+    Args:
+        pred_idx (np.ndarray): Predicted class index per window. Shape: (num_windows,).
+        pred_max (np.ndarray): Probability of the predicted class per window. Shape: (num_windows,).
+        is_word (np.ndarray): Boolean lookup by class index; False for '_blank_'.
+        threshold (float): Windows at or below this confidence are ignored.
 
     Returns:
-        np.ndarray: The padded or truncated sequence.
+        tuple: An int64 array holding the word indices and the number of entries used.
     """
-    if sequence.shape[0] > target_length:
-        return sequence[:target_length, :]
-    elif sequence.shape[0] < target_length:
-        padding = np.full((target_length - sequence.shape[0], sequence.shape[1]), padding_value, dtype=sequence.dtype)
-        return np.concatenate([sequence, padding], axis=0)
-    return sequence
\ No newline at end of file
+    out = np.empty(pred_idx.shape[0], dtype=np.int64)
+    n = 0
+    for i in range(pred_idx.shape[0]):
+        idx = pred_idx[i]
+        if pred_max[i] <= threshold or idx >= is_word.shape[0] or not is_word[idx]:
+            continue
+        if n == 0 or out[n - 1] != idx:
+            out[n] = idx
+            n += 1
+    return out, n
@@ -15,6 +15,7 @@ def build_bilstm_classifier(input_shape, hidden_size, num_layers, output_dim, dr
         if dropout_rate > 0:
             x = layers.Dropout(dropout_rate)(x)
 
-    output = layers.Dense(output_dim, activation='softmax')(x)
+    # Keep the softmax in float32 so it stays numerically stable under mixed precision
+    output = layers.Dense(output_dim, activation='softmax', dtype='float32')(x)
     model = models.Model(inputs=model_input, outputs=output, name='BiLSTM_GestureClassifier')
     return model
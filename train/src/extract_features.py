@@ -4,8 +4,17 @@ import glob
 import time
 import logging
 import argparse
+import functools
 import numpy as np
 import mediapipe as mp
+from enum import Enum
+from concurrent.futures import ProcessPoolExecutor
+
+# Optional: NVIDIA Video Processing Framework for NVDEC decoding
+try:
+    import PyNvCodec as nvc
+except ImportError:
+    nvc = None
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -15,68 +24,143 @@ NUM_HAND_FEATURES = 21 * 3  # 63 features per hand
 TOTAL_FEATURES = NUM_HAND_FEATURES * 2 # 126 features total
 MIN_DETECTION_CONFIDENCE = 0.5
 MIN_TRACKING_CONFIDENCE = 0.5
+GPU_ID = 0
+
+class ProcessStatus(Enum):
+    PROCESSED = "processed"
+    SKIPPED = "skipped"
+    FAILED = "failed"
 
-def extract_hand_features(results) -> np.ndarray:
+def extract_hand_features(results, out: np.ndarray = None) -> np.ndarray:
     """
     Extracts and normalizes features for left and right hands from Hands model results.
+    If `out` is given, the features are written into it in place instead of a new array.
     """
-    left_hand_kps = np.zeros(NUM_HAND_FEATURES, dtype=np.float32)
-    right_hand_kps = np.zeros(NUM_HAND_FEATURES, dtype=np.float32)
+    if out is None:
+        features = np.zeros(TOTAL_FEATURES, dtype=np.float32)
+    else:
+        features = out
+        features.fill(0.0)
 
     if results.multi_hand_landmarks and results.multi_handedness:
         for i, landmarks in enumerate(results.multi_hand_landmarks):
             handedness = results.multi_handedness[i].classification[0].label
-            wrist_lm = landmarks.landmark[0]
-            wrist_x, wrist_y, wrist_z = wrist_lm.x, wrist_lm.y, wrist_lm.z
-            hand_coords = []
-            for lm in landmarks.landmark:
-                hand_coords.extend([lm.x - wrist_x, lm.y - wrist_y, lm.z - wrist_z])
             if handedness == "Left":
-                left_hand_kps = np.array(hand_coords, dtype=np.float32)
+                offset = 0
             elif handedness == "Right":
-                right_hand_kps = np.array(hand_coords, dtype=np.float32)
-    return np.concatenate([left_hand_kps, right_hand_kps])
-
-def process_video(video_path: str, output_filepath: str):
-    logging.info(f"Processing video for hand keypoints: {video_path}")
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        logging.error(f"Error: Could not open video file {video_path}")
-        return False
-
-    valid_frames = []
-    with mp_hands.Hands(
-        static_image_mode=False,
-        max_num_hands=2,
-        min_detection_confidence=MIN_DETECTION_CONFIDENCE,
-        min_tracking_confidence=MIN_TRACKING_CONFIDENCE
-    ) as hands:
+                offset = NUM_HAND_FEATURES
+            else:
+                continue
+            coords = np.fromiter(
+                (v for lm in landmarks.landmark for v in (lm.x, lm.y, lm.z)),
+                dtype=np.float32, count=NUM_HAND_FEATURES
+            ).reshape(-1, 3)
+            coords -= coords[0]
+            features[offset:offset + NUM_HAND_FEATURES] = coords.ravel()
+    return features
+
+def _decode_gpu(decoder):
+    """Yields RGB frames decoded by NVDEC and colour-converted on the GPU."""
+    width, height = decoder.Width(), decoder.Height()
+    to_rgb = nvc.PySurfaceConverter(width, height, nvc.PixelFormat.NV12, nvc.PixelFormat.RGB, GPU_ID)
+    cc_ctx = nvc.ColorspaceConversionContext(decoder.ColorSpace(), decoder.ColorRange())
+    downloader = nvc.PySurfaceDownloader(width, height, nvc.PixelFormat.RGB, GPU_ID)
+    rgb_frame = np.empty(height * width * 3, dtype=np.uint8)
+    while True:
+        surface = decoder.DecodeSingleSurface()
+        if surface.Empty(): break
+        rgb_surface = to_rgb.Execute(surface, cc_ctx)
+        if rgb_surface.Empty() or not downloader.DownloadSingleSurface(rgb_surface, rgb_frame): break
+        yield rgb_frame.reshape(height, width, 3)
+
+def _decode_cpu(cap):
+    """Yields RGB frames decoded by OpenCV, converted into a single reused buffer."""
+    rgb_frame = None
+    try:
         while cap.isOpened():
             ret, frame = cap.read()
             if not ret: break
+            if rgb_frame is None:
+                rgb_frame = np.empty_like(frame)
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb_frame)
+    finally:
+        cap.release()
+
+def open_rgb_frames(video_path: str):
+    """
+    Returns an iterator over the RGB frames of a video and its reported frame count,
+    or None if it cannot be opened. Decoding runs on NVDEC when PyNvCodec and a CUDA
+    device are available, otherwise on the CPU.
+    """
+    if nvc is not None:
+        try:
+            decoder = nvc.PyNvDecoder(video_path, GPU_ID)
+            return _decode_gpu(decoder), decoder.Numframes()
+        except Exception as e:
+            logging.warning(f"GPU decode unavailable for {video_path}, falling back to CPU: {e}")
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        cap.release()
+        return None
+    return _decode_cpu(cap), int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
 
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = hands.process(rgb_frame)
-            
-            hand_keypoints = extract_hand_features(results)
-            
-            if hand_keypoints.any():
-                valid_frames.append(hand_keypoints)
-    cap.release()
+def process_video(video_path: str, output_dir: str, force: bool = False) -> ProcessStatus:
+    label = os.path.basename(os.path.dirname(video_path))
+    name_without_ext = os.path.splitext(os.path.basename(video_path))[0]
+    output_filepath = os.path.join(output_dir, label, f"{name_without_ext}.npy")
 
-    if not valid_frames:
+    if not force and os.path.exists(output_filepath):
+        return ProcessStatus.SKIPPED
+
+    logging.info(f"Processing video for hand keypoints: {video_path}")
+    opened = open_rgb_frames(video_path)
+    if opened is None:
+        logging.error(f"Error: Could not open video file {video_path}")
+        return ProcessStatus.FAILED
+    rgb_frames, frame_count = opened
+
+    # Rows are written in place; the reported frame count is only a hint, so grow if it undershoots.
+    keypoints = np.empty((max(frame_count, 1), TOTAL_FEATURES), dtype=np.float32)
+    count = 0
+    try:
+        # A fresh graph per video, so no tracking state carries over from the previous clip
+        with mp_hands.Hands(
+            static_image_mode=False,
+            max_num_hands=2,
+            min_detection_confidence=MIN_DETECTION_CONFIDENCE,
+            min_tracking_confidence=MIN_TRACKING_CONFIDENCE
+        ) as hands:
+            for rgb_frame in rgb_frames:
+                if count == keypoints.shape[0]:
+                    keypoints = np.concatenate([keypoints, np.empty_like(keypoints)])
+                results = hands.process(rgb_frame)
+
+                extract_hand_features(results, out=keypoints[count])
+
+                if keypoints[count].any():
+                    count += 1
+    except Exception as e:
+        # Decode errors can surface mid-file (e.g. an unsupported profile on NVDEC)
+        logging.error(f"Error processing {video_path}: {e}")
+        return ProcessStatus.FAILED
+    finally:
+        rgb_frames.close()
+
+    if count == 0:
         logging.warning(f"No valid hand keypoints found in {video_path}. Skipping.")
-        return False
+        return ProcessStatus.FAILED
     os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
-    np.save(output_filepath, np.array(valid_frames, dtype=np.float32))
-    logging.info(f"Saved {len(valid_frames)} valid frames to {output_filepath}")
-    return True
+    # Landmarks carry ~1e-3 precision, so float16 storage loses nothing and halves disk and load traffic
+    np.save(output_filepath, keypoints[:count].astype(np.float16))
+    logging.info(f"Saved {count} valid frames to {output_filepath}")
+    return ProcessStatus.PROCESSED
 
 def main():
     parser = argparse.ArgumentParser(description="Extract Hand keypoints using the MediaPipe Hands model.")
     parser.add_argument('--input_dir', type=str, default='raw_videos')
     parser.add_argument('--output_dir', type=str, default='processed_data')
     parser.add_argument('--force', action='store_true', help="Force reprocessing of all videos.")
+    parser.add_argument('--num_workers', type=int, default=(os.cpu_count() or 1), help="Number of worker processes.")
     args = parser.parse_args()
 
     os.makedirs(args.output_dir, exist_ok=True)
@@ -88,22 +172,13 @@ def main():
         return
     logging.info(f"Found {len(video_files)} videos to process.")
     start_time = time.time()
-    processed_count, failed_count, skipped_count = 0, 0, 0
-
-    for video_file in video_files:
-        label = os.path.basename(os.path.dirname(video_file))
-        filename = os.path.basename(video_file)
-        name_without_ext = os.path.splitext(filename)[0]
-        output_filepath = os.path.join(args.output_dir, label, f"{name_without_ext}.npy")
-
-        if not args.force and os.path.exists(output_filepath):
-            skipped_count += 1
-            continue
-
-        if process_video(video_file, output_filepath):
-            processed_count += 1
-        else:
-            failed_count += 1
+    worker = functools.partial(process_video, output_dir=args.output_dir, force=args.force)
+    with ProcessPoolExecutor(max_workers=args.num_workers) as executor:
+        results = list(executor.map(worker, video_files))
+
+    processed_count = results.count(ProcessStatus.PROCESSED)
+    skipped_count = results.count(ProcessStatus.SKIPPED)
+    failed_count = results.count(ProcessStatus.FAILED)
 
     end_time = time.time()
     logging.info("Processing Complete")
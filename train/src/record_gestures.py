@@ -1,9 +1,12 @@
 import os
 import cv2
-import time
+import shutil
 import logging
 import argparse
+import subprocess
+import numpy as np
 import mediapipe as mp
+from concurrent.futures import ThreadPoolExecutor
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s %(message)s')
 
@@ -14,12 +17,64 @@ RESOLUTION_WIDTH = 1280
 RESOLUTION_HEIGHT = 720
 DEFAULT_DURATION = 10
 DEFAULT_NUM_RECORDINGS = 10
+QUIT_KEY = ord('q')
 
 mp_pose = mp.solutions.pose
 mp_hands = mp.solutions.hands
 mp_drawing = mp.solutions.drawing_utils
 mp_drawing_style = mp.solutions.drawing_styles
 
+def ffmpeg_encoder_args(encoder: str) -> list:
+    """Returns the output encoding arguments used for both probing and recording."""
+    preset = 'p1' if encoder == 'h264_nvenc' else 'ultrafast'
+    return ['-c:v', encoder, '-preset', preset, '-pix_fmt', 'yuv420p']
+
+class FFmpegWriter:
+    """
+    Minimal cv2.VideoWriter stand-in that pipes raw BGR frames to an ffmpeg encoder process.
+    Raises IOError if ffmpeg exits early or finishes with a non-zero return code.
+    """
+    def __init__(self, output_filepath: str, encoder: str, fps: int, width: int, height: int):
+        self.output_filepath = output_filepath
+        self.proc = subprocess.Popen(
+            ['ffmpeg', '-loglevel', 'error', '-y', '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}',
+             '-r', str(fps), '-i', '-'] + ffmpeg_encoder_args(encoder) + [output_filepath],
+            stdin=subprocess.PIPE
+        )
+
+    def write(self, frame):
+        try:
+            self.proc.stdin.write(frame.data)
+        except BrokenPipeError:
+            raise IOError(f"ffmpeg exited early (code {self.proc.wait()}) while writing {self.output_filepath}")
+
+    def release(self):
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = self.proc.wait()
+        if returncode != 0:
+            raise IOError(f"ffmpeg failed with code {returncode} while encoding {self.output_filepath}")
+
+def select_ffmpeg_encoder(width: int, height: int, fps: int):
+    """
+    Returns 'h264_nvenc' if ffmpeg can encode on an NVIDIA GPU, 'libx264' if only CPU
+    encoding is available, or None if ffmpeg is not installed or neither encoder works.
+    Each encoder is probed with the same size, frame rate and arguments used for recording.
+    """
+    if shutil.which('ffmpeg') is None:
+        return None
+    for encoder in ('h264_nvenc', 'libx264'):
+        probe = subprocess.run(
+            ['ffmpeg', '-loglevel', 'error', '-f', 'lavfi', '-i', f'nullsrc=s={width}x{height}:r={fps}:d=0.1']
+            + ffmpeg_encoder_args(encoder) + ['-f', 'null', '-'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        if probe.returncode == 0:
+            return encoder
+    return None
+
 def record_gestures(label: str, num_recordings: int, duration: int, output_dir: str):
     """
     Record sign gestures
@@ -40,50 +95,76 @@ def record_gestures(label: str, num_recordings: int, duration: int, output_dir:
     fps = int(cap.get(cv2.CAP_PROP_FPS))
     if fps == 0: fps = 30
     fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    logging.info(f"Webcam initialized: {int(cap.get(3))}x{int(cap.get(4))} @ {fps} FPS.")
+    frame_width, frame_height = int(cap.get(3)), int(cap.get(4))
+    if frame_width <= 0 or frame_height <= 0:
+        # Some backends do not report a size; take it from a real frame instead
+        ret, frame = cap.read()
+        if not ret:
+            logging.error("Error: Could not read a frame from the webcam.")
+            cap.release()
+            return
+        frame_height, frame_width = frame.shape[:2]
+    logging.info(f"Webcam initialized: {frame_width}x{frame_height} @ {fps} FPS.")
+    num_frames = duration * fps
+    encoder = select_ffmpeg_encoder(frame_width, frame_height, fps)
+    logging.info(f"Video encoder: {encoder or 'OpenCV mp4v (no working ffmpeg encoder)'}")
 
     pose_draw_style = mp_drawing.DrawingSpec(color=(245, 117, 66), thickness=2, circle_radius=2)
     lhand_draw_style = mp_drawing.DrawingSpec(color=(252, 12, 125), thickness=2, circle_radius=2)
     rhand_draw_style = mp_drawing.DrawingSpec(color=(12, 252, 220), thickness=2, circle_radius=2)
 
-    with mp_hands.Hands(min_detection_confidence=MIN_DETECTION_CONFIDENCE, min_tracking_confidence=MIN_TRACKING_CONFIDENCE, max_num_hands=2) as hands, \
-        mp_pose.Pose(min_detection_confidence=MIN_DETECTION_CONFIDENCE, min_tracking_confidence=MIN_TRACKING_CONFIDENCE) as pose:
-        for i in range(1, num_recordings + 1):
-            output_filepath = os.path.join(label_dir, f"{label}_{i:02d}.mp4")
-            out = cv2.VideoWriter(output_filepath, fourcc, fps, (RESOLUTION_WIDTH, RESOLUTION_HEIGHT))
-            logging.info(f"Recording gesture '{label}', video {i}/{num_recordings}...")
-            start_time = time.time()
-            quit_flag = False
-
-            while (time.time() - start_time) < duration:
-                ret, frame = cap.read()
-                if not ret: break
-
-                frame = cv2.flip(frame, 1)
-                display_frame = frame.copy()
-                image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                results_hands = hands.process(image_rgb)
-                results_pose = pose.process(image_rgb)
-
-                mp_drawing.draw_landmarks(display_frame, results_pose.pose_landmarks, mp_pose.POSE_CONNECTIONS, landmark_drawing_spec=pose_draw_style, connection_drawing_spec=pose_draw_style)
-
-                if results_hands.multi_hand_landmarks and results_hands.multi_handedness:
-                    for idx, hand_landmarks in enumerate(results_hands.multi_hand_landmarks):
-                        hand_label = results_hands.multi_handedness[idx].classification[0].label
-                        hand_style = lhand_draw_style if hand_label == "Left" else rhand_draw_style
-                        mp_drawing.draw_landmarks(display_frame, hand_landmarks, mp_hands.HAND_CONNECTIONS, hand_style, hand_style)
-                cv2.imshow('Press [q] to Quit', display_frame)
-                out.write(frame)
-
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    quit_flag = True
-                    break
-            out.release()
-            logging.info(f"Saved clean video to: {output_filepath}.")
-            if quit_flag: break
+    try:
+        with mp_hands.Hands(min_detection_confidence=MIN_DETECTION_CONFIDENCE, min_tracking_confidence=MIN_TRACKING_CONFIDENCE, max_num_hands=2) as hands, \
+            mp_pose.Pose(min_detection_confidence=MIN_DETECTION_CONFIDENCE, min_tracking_confidence=MIN_TRACKING_CONFIDENCE) as pose, \
+            ThreadPoolExecutor(max_workers=1) as pose_executor:
+            image_rgb = None
+            for i in range(1, num_recordings + 1):
+                output_filepath = os.path.join(label_dir, f"{label}_{i:02d}.mp4")
+                if encoder:
+                    out = FFmpegWriter(output_filepath, encoder, fps, frame_width, frame_height)
+                else:
+                    out = cv2.VideoWriter(output_filepath, fourcc, fps, (frame_width, frame_height))
+                logging.info(f"Recording gesture '{label}', video {i}/{num_recordings}...")
+                quit_flag = False
+
+                try:
+                    for _ in range(num_frames):
+                        ret, frame = cap.read()
+                        if not ret: break
+
+                        frame = cv2.flip(frame, 1)
+                        # Save the clean frame before landmarks are drawn onto it for display
+                        out.write(frame)
+                        if image_rgb is None or image_rgb.shape != frame.shape:
+                            image_rgb = np.empty_like(frame)
+                        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=image_rgb)
+                        # The two graphs are independent and release the GIL, so run pose alongside hands
+                        pose_future = pose_executor.submit(pose.process, image_rgb)
+                        results_hands = hands.process(image_rgb)
+                        results_pose = pose_future.result()
+
+                        mp_drawing.draw_landmarks(frame, results_pose.pose_landmarks, mp_pose.POSE_CONNECTIONS, landmark_drawing_spec=pose_draw_style, connection_drawing_spec=pose_draw_style)
+
+                        if results_hands.multi_hand_landmarks and results_hands.multi_handedness:
+                            for idx, hand_landmarks in enumerate(results_hands.multi_hand_landmarks):
+                                hand_label = results_hands.multi_handedness[idx].classification[0].label
+                                hand_style = lhand_draw_style if hand_label == "Left" else rhand_draw_style
+                                mp_drawing.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS, hand_style, hand_style)
+                        cv2.imshow('Press [q] to Quit', frame)
+
+                        if cv2.waitKey(1) & 0xFF == QUIT_KEY:
+                            quit_flag = True
+                            break
+                finally:
+                    out.release()
+                logging.info(f"Saved clean video to: {output_filepath}.")
+                if quit_flag: break
+    except IOError as e:
+        logging.error(f"Error: Recording stopped. {e}")
+    finally:
         cap.release()
         cv2.destroyAllWindows()
-        logging.info("Recording session finished.")
+    logging.info("Recording session finished.")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Record sign gestures.")
@@ -1,5 +1,4 @@
 import os
-import sys
 import json
 import glob
 import logging
@@ -9,12 +8,13 @@ import seaborn as sns
 import tensorflow as tf
 from tensorflow import keras
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import matplotlib.pyplot as plt
 from tensorflow.keras import callbacks
 from bi_lstm_model import build_bilstm_classifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import confusion_matrix, classification_report
-from train_utils import load_config, save_config, pad_or_truncate_sequence, data_generator
+from train_utils import load_config, save_config, make_dataset
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -38,8 +38,25 @@ DEFAULT_CONFIG = {
     'early_stopping_patience': 15,
     'lr_scheduler_factor': 0.5,
     'lr_scheduler_patience': 7,
+    'num_load_workers': 8,
+    'mixed_precision': True,
 }
 
+def save_float32_model(weights_path: str, output_path: str, model_kwargs: dict):
+    """
+    Rebuilds the classifier under the float32 policy, loads the checkpointed weights and
+    saves it as the served .keras model, whatever policy was used for training.
+    """
+    training_policy = keras.mixed_precision.global_policy()
+    keras.mixed_precision.set_global_policy('float32')
+    try:
+        float32_model = build_bilstm_classifier(**model_kwargs)
+        float32_model.load_weights(weights_path)
+        float32_model.save(output_path)
+    finally:
+        keras.mixed_precision.set_global_policy(training_policy)
+    logging.info(f"Saved best model with float32 policy to {output_path}")
+
 def main():
     parser = argparse.ArgumentParser(description="Train a Bi-LSTM classifier on Pose and Hand data.")
     parser.add_argument('--config_file', type=str, default=None, help="Path to a JSON configuration file.")
@@ -68,32 +85,35 @@ def main():
         json.dump(idx_to_label, f, indent=4)
     logging.info(f"Label mapping saved to {label_map_path}")
 
-    all_sequences, all_labels = [], []
+    # Validate shapes from the .npy headers first so X can be allocated at its final size
+    valid_paths, all_labels = [], []
     for path in all_data_paths:
         try:
-            keypoints = np.load(path)
+            keypoints = np.load(path, mmap_mode='r')
             if keypoints.ndim != 2 or keypoints.shape[1] != config['feature_dim']:
                 logging.warning(f"Skipping mismatched file: {path} (Shape: {keypoints.shape}, Expected: {config['feature_dim']})")
                 continue
-            all_sequences.append(pad_or_truncate_sequence(keypoints, config['sequence_length']))
             label_name = os.path.basename(os.path.dirname(path))
             all_labels.append(label_to_idx[label_name])
+            valid_paths.append(path)
         except Exception as e:
             logging.error(f"Error loading or processing {path}: {e}. Skipping.")
 
-    if not all_sequences:
+    if not valid_paths:
         logging.error("No valid sequences could be loaded. Please check logs for mismatched files. Exiting.")
         return
 
-    try:
-        X = np.array(all_sequences, dtype=np.float32)
-    except ValueError:
-        logging.error("CRITICAL: Failed to create NumPy array from sequences due to inconsistent shapes.", exc_info=True)
-        sys.exit(1)
+    # Zero-initialised, so copying at most sequence_length rows pads and truncates in one step
+    X = np.zeros((len(valid_paths), config['sequence_length'], config['feature_dim']), dtype=np.float32)
 
-    if X.dtype == 'object':
-        logging.error(f"CRITICAL: Feature matrix X has dtype 'object'. This confirms inconsistent data shapes. Please clean your 'processed_data' directory and re-run feature extraction.")
-        sys.exit(1)
+    def load_sequence(i, path):
+        keypoints = np.load(path, mmap_mode='r')
+        num_frames = min(keypoints.shape[0], config['sequence_length'])
+        # Features may be stored as float16; assigning into X upcasts to float32
+        X[i, :num_frames] = keypoints[:num_frames]
+
+    with ThreadPoolExecutor(max_workers=config['num_load_workers']) as executor:
+        list(executor.map(load_sequence, range(len(valid_paths)), valid_paths))
 
     y = tf.keras.utils.to_categorical(np.array(all_labels, dtype=np.int32), num_classes=num_classes)
 
@@ -103,13 +123,21 @@ def main():
     logging.info(f"TRAINING ON POSE AND HANDS. Feature dimension: {config['feature_dim']}")
     logging.info(f"Training samples: {X_train.shape[0]}, Validation samples: {X_val.shape[0]}, Testing samples: {X_test.shape[0]}")
 
-    model = build_bilstm_classifier(
+    use_mixed_precision = bool(config['mixed_precision'] and tf.config.list_physical_devices('GPU'))
+    if use_mixed_precision:
+        keras.mixed_precision.set_global_policy('mixed_float16')
+        logging.info("Mixed precision enabled (mixed_float16).")
+    elif config['mixed_precision']:
+        logging.info("No GPU found. Mixed precision disabled, training in float32.")
+
+    model_kwargs = dict(
         input_shape=(config['sequence_length'], config['feature_dim']),
         hidden_size=config['hidden_size'],
         num_layers=config['num_layers'],
         output_dim=num_classes,
         dropout_rate=config['dropout_rate']
     )
+    model = build_bilstm_classifier(**model_kwargs)
     
     model.compile(
         optimizer=keras.optimizers.Adam(learning_rate=config['learning_rate']),
@@ -117,17 +145,27 @@ def main():
         metrics=['accuracy', tf.keras.metrics.Precision(name='precision'), tf.keras.metrics.Recall(name='recall')]
     )
     
+    # Checkpoint weights only; the served .keras model is always written from them in float32
+    weights_path = os.path.join(config['output_model_dir'], 'best_model.weights.h5')
+    served_model_path = os.path.join(config['output_model_dir'], 'best_model_tf.keras')
+    if os.path.exists(weights_path):
+        os.remove(weights_path)
     model_callbacks = [
         callbacks.CSVLogger(os.path.join(config['output_model_dir'], config['log_file_name']), append=True),
         callbacks.EarlyStopping(monitor='val_loss', patience=config['early_stopping_patience'], restore_best_weights=True),
         callbacks.ReduceLROnPlateau(monitor='val_loss', factor=config['lr_scheduler_factor'], patience=config['lr_scheduler_patience']),
-        callbacks.ModelCheckpoint(filepath=os.path.join(config['output_model_dir'], 'best_model_tf.keras'), monitor='val_loss', save_best_only=True)
+        callbacks.ModelCheckpoint(filepath=weights_path, monitor='val_loss', save_best_only=True, save_weights_only=True)
     ]
-    train_gen = data_generator(X_train, y_train, config['batch_size'], augment=True)
-    val_gen = data_generator(X_val, y_val, config['batch_size'], augment=False)
+    train_ds = make_dataset(X_train, y_train, config['batch_size'], augment=True, shuffle=True)
+    val_ds = make_dataset(X_val, y_val, config['batch_size'])
     
     logging.info("--- Starting Training ---")
-    history = model.fit(train_gen, steps_per_epoch=max(1, len(X_train) // config['batch_size']), validation_data=val_gen, validation_steps=max(1, len(X_val) // config['batch_size']), epochs=config['epochs'], callbacks=model_callbacks, verbose=1)
+    try:
+        history = model.fit(train_ds, validation_data=val_ds, epochs=config['epochs'], callbacks=model_callbacks, verbose=1)
+    finally:
+        # Also runs if training is interrupted, so the served model never carries mixed_float16
+        if os.path.exists(weights_path):
+            save_float32_model(weights_path, served_model_path, model_kwargs)
     
     logging.info("--- Final Evaluation on Test Set ---")
     y_pred_probs = model.predict(X_test)
@@ -1,6 +1,6 @@
 import json
 import logging
-import numpy as np
+import tensorflow as tf
 
 def save_config(config, filepath):
     """Saves the configuration to a JSON file."""
@@ -15,45 +15,23 @@ def load_config(filepath):
     logging.info(f"Configuration loaded from {filepath}")
     return config
 
-def pad_or_truncate_sequence(sequence: np.ndarray, target_length: int, padding_value: float = 0.0) -> np.ndarray:
-    """Pads or truncates a NumPy sequence to a target length."""
-    if sequence.shape[0] > target_length:
-        return sequence[:target_length, :]
-    elif sequence.shape[0] < target_length:
-        padding = np.full((target_length - sequence.shape[0], sequence.shape[1]), padding_value, dtype=sequence.dtype)
-        return np.concatenate([sequence, padding], axis=0)
-    return sequence
+def augment_batch(X_batch: tf.Tensor, y_batch: tf.Tensor):
+    """Applies random noise and scaling to each sequence in a batch, using TF ops only."""
+    batch_size = tf.shape(X_batch)[0]
+    apply_noise = tf.random.uniform([batch_size, 1, 1]) < 0.8
+    noise = tf.random.normal(tf.shape(X_batch), stddev=0.05, dtype=X_batch.dtype)
+    X_batch = tf.where(apply_noise, X_batch + noise, X_batch)
+    apply_scale = tf.random.uniform([batch_size, 1, 1]) < 0.8
+    scale_factor = tf.random.uniform([batch_size, 1, 1], 0.7, 1.3, dtype=X_batch.dtype)
+    X_batch = tf.where(apply_scale, X_batch * scale_factor, X_batch)
+    return X_batch, y_batch
 
-def add_noise(sequence: np.ndarray, noise_level=0.001) -> np.ndarray:
-    """Adds Gaussian noise to a keypoint sequence."""
-    noise = np.random.normal(0, noise_level, sequence.shape)
-    return sequence + noise
-
-def scale_sequence(sequence: np.ndarray, scale_range=(0.8, 1.2)) -> np.ndarray:
-    """Scales a keypoint sequence."""
-    scale_factor = np.random.uniform(scale_range[0], scale_range[1])
-    return sequence * scale_factor
-
-def augment_sequence(sequence: np.ndarray) -> np.ndarray:
-    """Applies a random set of augmentations to a sequence."""
-    augmented_sequence = sequence.copy()
-    if np.random.rand() < 0.8:
-        augmented_sequence = add_noise(augmented_sequence, noise_level=0.05)
-    if np.random.rand() < 0.8:
-        augmented_sequence = scale_sequence(augmented_sequence, scale_range=(0.7, 1.3))
-    return augmented_sequence
-
-def data_generator(X_data, y_data, batch_size, augment=False):
-    """Generates batches of data with optional on-the-fly augmentation."""
-    num_samples = len(X_data)
-    while True:
-        indices = np.arange(num_samples)
-        np.random.shuffle(indices)
-        for i in range(0, num_samples, batch_size):
-            batch_indices = indices[i:i+batch_size]
-            X_batch, y_batch = X_data[batch_indices], y_data[batch_indices]
-            if augment:
-                X_batch_augmented = np.array([augment_sequence(seq) for seq in X_batch])
-                yield X_batch_augmented, y_batch
-            else:
-                yield X_batch, y_batch
+def make_dataset(X_data, y_data, batch_size, augment=False, shuffle=False) -> tf.data.Dataset:
+    """Builds a batched, prefetched tf.data pipeline with optional on-the-fly augmentation."""
+    dataset = tf.data.Dataset.from_tensor_slices((X_data, y_data))
+    if shuffle:
+        dataset = dataset.shuffle(len(X_data), reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    if augment:
+        dataset = dataset.map(augment_batch, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
@@ -5,16 +5,27 @@ import argparse
 import numpy as np
 import seaborn as sns
 from sklearn.manifold import TSNE
+from sklearn.decomposition import PCA
 import matplotlib.pyplot as plt
 
+# Optional: RAPIDS cuML runs t-SNE on the GPU
+try:
+    from cuml.manifold import TSNE as GPU_TSNE
+except ImportError:
+    GPU_TSNE = None
+
+PCA_COMPONENTS = 50
+FEATURE_DIM_HANDS = 21 * 3 * 2
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def create_feature_summary(data: np.ndarray) -> np.ndarray:
-    """Creates a single feature vector summarizing a whole sequence."""
-    # We can use mean and std deviation as a simple summary
-    mean = np.mean(data, axis=0)
-    std = np.std(data, axis=0)
-    return np.concatenate([mean, std])
+def create_feature_summary(data: np.ndarray, out: np.ndarray) -> np.ndarray:
+    """Writes a single feature vector summarizing a whole sequence into `out`."""
+    # We can use mean and std deviation as a simple summary, accumulated in float32
+    feature_dim = data.shape[1]
+    np.mean(data, axis=0, dtype=np.float32, out=out[:feature_dim])
+    np.std(data, axis=0, dtype=np.float32, out=out[feature_dim:])
+    return out
 
 def visualize_data_clusters(data_dir: str):
     """
@@ -26,32 +37,42 @@ def visualize_data_clusters(data_dir: str):
         logging.error(f"No .npy files found in '{data_dir}'. Exiting.")
         return
 
-    all_summaries = []
+    feature_matrix = np.empty((len(all_data_paths), 2 * FEATURE_DIM_HANDS), dtype=np.float32)
     all_labels = []
-    
+
     for path in all_data_paths:
         try:
-            keypoints = np.load(path)
+            keypoints = np.load(path, mmap_mode='r')
+            if keypoints.ndim != 2 or keypoints.shape[1] != FEATURE_DIM_HANDS:
+                logging.warning(f"Skipping mismatched file: {path} (Shape: {keypoints.shape}, Expected: {FEATURE_DIM_HANDS})")
+                continue
             if keypoints.size == 0: continue
-            
-            summary_vector = create_feature_summary(keypoints)
-            all_summaries.append(summary_vector)
-            
+
+            create_feature_summary(keypoints, out=feature_matrix[len(all_labels)])
+
             label_name = path.split(os.sep)[-2]
             all_labels.append(label_name)
         except Exception as e:
             logging.error(f"Error processing {path}: {e}")
 
-    if not all_summaries:
+    if not all_labels:
         logging.error("No valid data could be processed.")
         return
 
-    feature_matrix = np.array(all_summaries)
+    feature_matrix = feature_matrix[:len(all_labels)]
     labels_array = np.array(all_labels)
 
-    logging.info(f"Running t-SNE on {feature_matrix.shape[0]} samples... This may take a moment.")
-    tsne = TSNE(n_components=2, verbose=1, perplexity=min(30, len(feature_matrix)-1), n_iter=300, random_state=42)
-    tsne_results = tsne.fit_transform(feature_matrix)
+    # Reduce to a few dozen dimensions first; t-SNE is both faster and less noisy on PCA output
+    n_components = min(PCA_COMPONENTS, *feature_matrix.shape)
+    reduced_matrix = PCA(n_components=n_components, random_state=42).fit_transform(feature_matrix)
+
+    logging.info(f"Running t-SNE on {feature_matrix.shape[0]} samples ({'GPU' if GPU_TSNE else 'CPU'})... This may take a moment.")
+    perplexity = min(30, len(feature_matrix)-1)
+    if GPU_TSNE is not None:
+        tsne = GPU_TSNE(n_components=2, verbose=1, perplexity=perplexity, n_iter=300, method='barnes_hut', random_state=42)
+    else:
+        tsne = TSNE(n_components=2, verbose=1, perplexity=perplexity, n_iter=300, method='barnes_hut', init='pca', n_jobs=-1, random_state=42)
+    tsne_results = np.asarray(tsne.fit_transform(reduced_matrix))
 
     logging.info("Plotting results...")
     plt.figure(figsize=(16, 10))